@@ -25,6 +25,11 @@ VIA3D_name = re.compile('^VIA#([a-z]+) +(\((\d+),(\d+),(\d+)\))+', re.IGNORECASE
 VIA3D_pos  = re.compile('[- ]\((\d+),(\d+),(\d+)\)', re.IGNORECASE)
 LAYER_name = re.compile('^LAYER ([0-9]+)$', re.IGNORECASE)
 
+# 行の先頭のキーワードを調べるためのパタン
+# 一度のマッチで行の種類がわかるので，どのパタンで調べればよいかを
+# m.lastgroup で振り分けることができる．
+KEYWORD    = re.compile('(?P<SIZE>SIZE )|(?P<LINE_NUM>LINE_NUM )|(?P<LINE>LINE#)|(?P<VIA>VIA#)|(?P<LAYER>LAYER )', re.IGNORECASE)
+
 
 ### @brief ADC2016/ADC2017 フォーマットの読み込み用クラス
 ###
@@ -75,24 +80,23 @@ class ADC_Reader :
         self.__has_SIZE = False
         self.__has_LINE_NUM = False
 
-        # ネット番号の重複チェック用の辞書
-        # そのネット番号を定義している行番号を入れる．
-        self.__net_dict = dict()
+        # ネット番号の重複チェック用のリスト
+        # __net_lineno_list[net_id] にそのネット番号を定義している行番号を入れる．
+        # まだ定義されていない時は 0 となる．
+        # ネット番号は 1 から LINE_NUM までなので LINE_NUM 行を読んだ時に確保する．
+        self.__net_lineno_list = []
 
         # ビアラベルの重複チェック用の辞書
         # そのビアを定義している行番号を入れる．
         self.__via_dict = dict()
 
         # 基本的には1行づつ読み込んで処理していく．
-        while True :
-            # 1行を読み出し末尾の改行を取る．
-            # ほぼ定石のコード
-            line = fin.readline()
-            self.__cur_lineno += 1
-            if line == '' :
-                # EOF
-                break
+        # readline() を繰り返し呼ぶ代わりにファイルオブジェクトの
+        # イテレータを使うとバッファ単位で読み込まれる．
+        for lineno, line in enumerate(fin, 1) :
+            self.__cur_lineno = lineno
 
+            # 末尾の改行を取る．
             line = line.rstrip()
             if line == '' :
                 # 空行を読み飛ばす．
@@ -100,27 +104,30 @@ class ADC_Reader :
 
             self.__cur_line = line
 
-            # SIZE(2D) 行の処理
-            if self.__read_SIZE2D() :
-                self.__problem.set_size(self.__dim)
-                continue;
+            # 先頭のキーワードで行の種類を判断する．
+            m = KEYWORD.match(line)
+            key = m.lastgroup if m is not None else None
 
-            # SIZE(3D) 行の処理
-            if self.__read_SIZE3D() :
-                self.__problem.set_size(self.__dim)
-                continue;
+            if key == 'SIZE' :
+                # SIZE(2D) 行か SIZE(3D) 行の処理
+                if self.__read_SIZE2D() or self.__read_SIZE3D() :
+                    self.__problem.set_size(self.__dim)
+                    continue
 
-            # LINE_NUM 行の処理
-            if self.__read_LINE_NUM() :
-                continue
+            elif key == 'LINE_NUM' :
+                # LINE_NUM 行の処理
+                if self.__read_LINE_NUM() :
+                    continue
 
-            # LINE# 行の処理
-            if self.__read_LINE() :
-                continue
+            elif key == 'LINE' :
+                # LINE# 行の処理
+                if self.__read_LINE() :
+                    continue
 
-            # VIA# 行の処理
-            if self.__read_VIA() :
-                continue
+            elif key == 'VIA' :
+                # VIA# 行の処理
+                if self.__read_VIA() :
+                    continue
 
             # それ以外はエラー
             self.__error('syntax error')
@@ -147,15 +154,12 @@ class ADC_Reader :
         self.__cur_z = 0
 
         # 基本的には1行づつ読み込んで処理していく．
-        while True :
-            # 1行を読み出し末尾の改行を取る．
-            # ほぼ定石のコード
-            line = fin.readline()
-            self.__cur_lineno += 1
-            if line == '' :
-                # EOF
-                break
+        # readline() を繰り返し呼ぶ代わりにファイルオブジェクトの
+        # イテレータを使うとバッファ単位で読み込まれる．
+        for lineno, line in enumerate(fin, 1) :
+            self.__cur_lineno = lineno
 
+            # 末尾の改行を取る．
             line = line.rstrip()
             if line == '' :
                 # 空行を読み飛ばす．
@@ -163,21 +167,23 @@ class ADC_Reader :
 
             self.__cur_line = line
 
-            # SIZE(2D) 行の処理
-            if self.__read_SIZE2D() :
-                self.__solution.set_size(self.__dim)
-                self.__cur_y = self.__dim.height
-                continue;
+            # 先頭のキーワードで行の種類を判断する．
+            # 大部分を占める値の行ではどのキーワードにもマッチしないので
+            # 1回のマッチで済む．
+            m = KEYWORD.match(line)
+            key = m.lastgroup if m is not None else None
 
-            # SIZE(3D) 行の処理
-            if self.__read_SIZE3D() :
-                self.__solution.set_size(self.__dim)
-                self.__cur_y = self.__dim.height
-                continue;
+            if key == 'SIZE' :
+                # SIZE(2D) 行か SIZE(3D) 行の処理
+                if self.__read_SIZE2D() or self.__read_SIZE3D() :
+                    self.__solution.set_size(self.__dim)
+                    self.__cur_y = self.__dim.height
+                    continue
 
-            # LAYER 行の処理
-            if self.__read_LAYER() :
-                continue
+            elif key == 'LAYER' :
+                # LAYER 行の処理
+                if self.__read_LAYER() :
+                    continue
 
             # それ以外
             # 1行分の値が','で区切られている．
@@ -192,10 +198,8 @@ class ADC_Reader :
                 self.__error('# of elements mismatch')
                 continue
 
-            for x in range(0, self.__dim.width) :
-                point = Point(x, self.__cur_y, self.__cur_z)
-                val = int(val_list[x])
-                self.__solution.set_val(point, val)
+            # 1行分の値をまとめて設定する．
+            self.__solution.set_row(self.__cur_y, self.__cur_z, list(map(int, val_list)))
             self.__cur_y += 1
             if self.__cur_y == self.__dim.height :
                 self.__cur_z += 1
@@ -229,6 +233,7 @@ class ADC_Reader :
         height = int(m.group(2))
         depth = 1
         self.__dim = Dimension(width, height, depth)
+        self.__bounds = width, height, depth
         self.__has_SIZE = True
         self.__2D = True
         self.SIZE_lineno = self.__cur_lineno
@@ -257,6 +262,7 @@ class ADC_Reader :
         height = int(m.group(2))
         depth = int(m.group(3))
         self.__dim = Dimension(width, height, depth)
+        self.__bounds = width, height, depth
         self.__has_SIZE = True
         self.__2D = False
         self.SIZE_lineno = self.__cur_lineno
@@ -282,6 +288,7 @@ class ADC_Reader :
             return True
 
         self.__line_num = int(m.group(1))
+        self.__net_lineno_list = [0] * (self.__line_num + 1)
         self.__has_LINE_NUM = True
         self.LINE_NUM_lineno = self.__cur_lineno
         return True
@@ -318,9 +325,11 @@ class ADC_Reader :
             self.__error("Missing 'LINE_NUM' before 'LINE'")
             return True
 
+        # 線分番号と座標の値をまとめて整数に変換する．
+        val_list = [int(val) for val in m.groups()]
+
         # 線分番号を得る．
-        #net_id = int(m.groups()[0])
-        net_id = int(m.group(1))
+        net_id = val_list[0]
 
         # 番号が範囲内にあるかチェックする．
         if not 1 <= net_id <= self.__line_num :
@@ -328,27 +337,22 @@ class ADC_Reader :
             return True
 
         # 重複していないか調べる．
-        if net_id in self.__net_dict :
-            prev = self.__net_dict[net_id]
+        prev = self.__net_lineno_list[net_id]
+        if prev != 0 :
             self.__error('Duplicated LINE#{}, previously defined at line {}.'.format(net_id, prev))
             return True
-        self.__net_dict[net_id] = self.__cur_lineno
+        self.__net_lineno_list[net_id] = self.__cur_lineno
 
         # 線分の始点と終点を求める．
+        # ファイルフォーマットでは層番号は1から始まる．
         if self.__2D :
-            x0 = int(m.group(2))
-            y0 = int(m.group(3))
+            net_id, x0, y0, x1, y1 = val_list
             z0 = 0
-            x1 = int(m.group(4))
-            y1 = int(m.group(5))
             z1 = 0
         else :
-            x0 = int(m.group(2))
-            y0 = int(m.group(3))
-            z0 = int(m.group(4)) - 1
-            x1 = int(m.group(5))
-            y1 = int(m.group(6))
-            z1 = int(m.group(7)) - 1
+            net_id, x0, y0, z0, x1, y1, z1 = val_list
+            z0 -= 1
+            z1 -= 1
 
         # 範囲チェックを行う．
         if not self.__check_range(x0, y0, z0) :
@@ -387,11 +391,11 @@ class ADC_Reader :
         via_label = m.groups()[0]
 
         # ラベルが重複していないか調べる．
-        if via_label in self.__via_dict :
-            prev = self.__via_dict[via_label]
+        # 初めてのラベルなら現在の行番号が登録されてそのまま返ってくる．
+        prev = self.__via_dict.setdefault(via_label, self.__cur_lineno)
+        if prev != self.__cur_lineno :
             self.__error('Duplicated VIA#{}, previously defined at line {}'.format(via_label, prev))
             return True
-        self.__via_dict[via_label] = self.__cur_lineno
 
         first_time = True
         z_list = []
@@ -469,20 +473,21 @@ class ADC_Reader :
     ### @param[in] x, y, z 座標
     ### @retval True 範囲内だった．
     ### @retval False 範囲外だった．
+    ###
+    ### 範囲は SIZE行を読んだ時に __bounds に入れておいたものを使う．
     def __check_range(self, x, y, z) :
-        if not 0 <= x < self.__dim.width :
-            self.__error('X({}) is out of range.'.format(x))
-            return False
+        width, height, depth = self.__bounds
+        if 0 <= x < width and 0 <= y < height and 0 <= z < depth :
+            return True
 
-        if not 0 <= y < self.__dim.height :
+        # ここから先はエラーの時だけ実行される．
+        if not 0 <= x < width :
+            self.__error('X({}) is out of range.'.format(x))
+        elif not 0 <= y < height :
             self.__error('Y({}) is out of range.'.format(y))
-            return False
-
-        if not 0 <= z < self.__dim.depth :
+        else :
             self.__error('Z({}) is out of range.'.format(z + 1))
-            return False
-
-        return True
+        return False
 
     ### エラー処理
     ### @param[in] msg エラーメッセージ
@@ -0,0 +1,159 @@
+#! /usr/bin/env python3
+
+### @file dimacs_writer.py
+### @brief DimacsWriter の定義ファイル
+### @author Yusuke Matsunaga (松永 裕介)
+###
+### Copyright (C) 2017 Yusuke Matsunaga
+### All rights reserved.
+
+import io
+import itertools
+
+
+### @brief CNF式を DIMACS 形式で書き出すクラス
+###
+### CnfEncoder が用いる SatSolver の関数のうち，節を追加する関数だけを持つ．
+### SATソルバを作らずに節を直接文字列として溜めていくので，
+### 巨大な問題の CNF 式を書き出すだけの時に用いる．
+###
+### リテラルは Literal ではなく単なる整数で表す．
+### 変数番号 v (0から始まる)の肯定リテラルは v，否定リテラルは ~v (= -v - 1)となる．
+### こうしておくと CnfEncoder 側のコード(~var など)をそのまま使うことができる．
+###
+### @code
+### writer = DimacsWriter()
+### v1 = writer.new_variable()
+### v2 = writer.new_variable()
+### writer.add_clause([v1, ~v2])
+### writer.write(fout)
+### @endcode
+###
+### という風に使う．
+class DimacsWriter :
+
+    ### @brief 初期化
+    def __init__(self) :
+        self.__var_num = 0
+        self.__clause_num = 0
+        self.__literal_num = 0
+        self.__cond_lits = []
+        self.__body = io.StringIO()
+
+    ### @brief 変数を作る．
+    ### @return 肯定リテラルを表す整数を返す．
+    def new_variable(self) :
+        var = self.__var_num
+        self.__var_num += 1
+        return var
+
+    ### @brief 変数をまとめて作る．
+    ### @param[in] n 作る変数の数
+    ### @return 肯定リテラルを表す整数の range を返す．
+    ###
+    ### 変数番号は連続しているので個々の整数をリストに持たずに range で表す．
+    def new_variables(self, n) :
+        var0 = self.__var_num
+        self.__var_num += n
+        return range(var0, var0 + n)
+
+    ### @brief 条件リテラルを設定する．
+    ### @param[in] lit_list 条件リテラルのリスト
+    ###
+    ### 以降に追加される節は lit_list のリテラルが全て真の時のみ意味を持つ．
+    def set_conditional_literals(self, lit_list) :
+        self.__cond_lits = [~lit for lit in lit_list]
+
+    ### @brief 条件リテラルをクリアする．
+    def clear_conditional_literals(self) :
+        self.__cond_lits = []
+
+    ### @brief 節を追加する．
+    ### @param[in] lit_list リテラルのリスト
+    def add_clause(self, lit_list) :
+        self.add_clauses([lit_list])
+
+    ### @brief 複数の節をまとめて追加する．
+    ### @param[in] clause_list 節(リテラルのリスト)のリスト
+    ###
+    ### 節ごとに書き込むのではなく，まとめて文字列にしてから1度に書き込む．
+    def add_clauses(self, clause_list) :
+        cond_lits = self.__cond_lits
+        lines = []
+        literal_num = 0
+        for lit_list in clause_list :
+            lits = list(lit_list) + cond_lits
+            lines.append(' '.join([str(lit + 1 if lit >= 0 else lit) for lit in lits]))
+            lines.append(' 0\n')
+            literal_num += len(lits)
+        self.__body.write(''.join(lines))
+        self.__clause_num += len(lines) // 2
+        self.__literal_num += literal_num
+
+    ### @brief 2つのリテラルが等しいという制約を追加する．
+    ### @param[in] lit1, lit2 対象のリテラル
+    ### @param[in] cvar_list 条件リテラルのリスト
+    def add_eq_rel(self, lit1, lit2, cvar_list = []) :
+        tmp = [~lit for lit in cvar_list]
+        self.add_clauses([[~lit1,  lit2] + tmp,
+                          [ lit1, ~lit2] + tmp])
+
+    ### @brief 高々1つのリテラルが真になるという制約を追加する．
+    ### @param[in] lit_list リテラルのリスト
+    def add_at_most_one(self, lit_list) :
+        nlit_list = [~lit for lit in lit_list]
+        self.add_clauses(itertools.combinations(nlit_list, 2))
+
+    ### @brief 高々2つのリテラルが真になるという制約を追加する．
+    ### @param[in] lit_list リテラルのリスト
+    ###
+    ### 否定リテラルはまとめて作っておき，3つ組ごとに節を作る．
+    def add_at_most_two(self, lit_list) :
+        nlit_list = [~lit for lit in lit_list]
+        self.add_clauses(itertools.combinations(nlit_list, 3))
+
+    ### @brief 少なくとも2つのリテラルが真になるという制約を追加する．
+    ### @param[in] lit_list リテラルのリスト
+    ### @param[in] cvar_list 条件リテラルのリスト
+    def add_at_least_two(self, lit_list, cvar_list = []) :
+        tmp = [~lit for lit in cvar_list]
+        n = len(lit_list)
+        self.add_clauses([lit_list[:i] + lit_list[i + 1:] + tmp for i in range(0, n)])
+
+    ### @brief ちょうど1つのリテラルが真になるという制約を追加する．
+    ### @param[in] lit_list リテラルのリスト
+    def add_exact_one(self, lit_list) :
+        self.add_at_most_one(lit_list)
+        self.add_clause(lit_list)
+
+    ### @brief ちょうど2つのリテラルが真になるという制約を追加する．
+    ### @param[in] lit_list リテラルのリスト
+    def add_exact_two(self, lit_list) :
+        self.add_at_most_two(lit_list)
+        self.add_at_least_two(lit_list)
+
+    ### @brief ちょうど1つのリテラルが真になることはないという制約を追加する．
+    ### @param[in] lit_list リテラルのリスト
+    def add_not_one(self, lit_list) :
+        n = len(lit_list)
+        self.add_clauses([[~lit_list[i]] + lit_list[:i] + lit_list[i + 1:] for i in range(0, n)])
+
+    ### @brief 変数の数を返す．
+    def variable_num(self) :
+        return self.__var_num
+
+    ### @brief 節の数を返す．
+    def clause_num(self) :
+        return self.__clause_num
+
+    ### @brief リテラルの数を返す．
+    def literal_num(self) :
+        return self.__literal_num
+
+    ### @brief 内容を DIMACS 形式で出力する．
+    ### @param[in] fout 出力先のファイルオブジェクト
+    def write(self, fout) :
+        print('p cnf {} {}'.format(self.__var_num, self.__clause_num), file = fout)
+        fout.write(self.__body.getvalue())
+
+# end of dimacs_writer.py
@@ -13,8 +13,11 @@ from nl3d.point import Point
 ### @brief 問題のサイズを表すクラス
 ###
 ### 基本的に初期化時に設定した値は変更されない．
+### __slots__ でメンバを固定してインスタンスごとの辞書を持たないようにしている．
 class Dimension :
 
+    __slots__ = ('__width', '__height', '__depth')
+
     ### @brief 初期化
     ### @param[in] width 幅
     ### @param[in] height 高さ
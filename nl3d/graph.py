@@ -7,51 +7,77 @@
 ### Copyright (C) 2017 Yusuke Matsunaga
 ### All rights reserved.
 
+import functools
+from nl3d.point import Point
+
 
 ### @brief 節点を表すクラス
 ###
 ### 以下のメンバを持つ．
-### - ID番号
+### - ID番号(id)
 ### - 位置(__point)
+### - 座標(x, y, z)
 ### - 接続している枝のリスト(__edge_list)
-### - 各方向の枝(__x1_edge, __x2_edge, __y1_edge, __y2_edge, __z1__edge, __z2_edge)
-### - 終端の時に True となるフラグ(__is_terminal)
+###   最初に参照された時に __dir_edge_list から作る．
+### - 方向をインデックスとする各方向の枝の表(__dir_edge_list)
+### - 各方向の隣接ノード(__adj_node_list)
+### - 枝の ID 番号と隣接ノードの組のリスト(__adj_list)
+###   最初に参照された時に __dir_edge_list と __adj_node_list から作る．
+### - 終端の時に True となるフラグ(is_terminal)
 ### - 終端の時の線分番号(__terminal_id)
-### - ビアの時に True となるフラグ(__is_via)
+### - ビアの時に True となるフラグ(is_via)
 ### - ビアの時のビア番号(__via_id)
+### - 終端かビアの時に True となるフラグ(is_block)
+### - 節点の種類(kind)
+###   0: 通常の節点, 1: 終端, 2: ビア
 ###
 ### ただし @property 属性のついたメンバ関数をメンバのようにアクセスすること．
+### id, x, y, z と is_terminal, is_via, is_block, kind は符号化の内側のループで
+### 頻繁に参照されるので @property を介さない公開メンバにしている．
+### 読み出し専用として扱うこと．
+###
+### 節点はグリッドのマス目の数だけ作られるので __slots__ でメンバを固定して
+### インスタンスごとの辞書を持たないようにしている．
 class Node :
 
+    __slots__ = ('id', '__point', 'x', 'y', 'z', '__edge_list',
+                 '__dir_edge_list', '__adj_node_list', '__adj_list',
+                 'is_terminal', '__terminal_id', 'is_via', '__via_id', 'is_block', 'kind')
+
     ### @brief 初期化
     ### @param[in] id ID番号
     ### @param[in] point 位置
     def __init__(self, id, point) :
-        self.__id = id
+        self.id = id
         self.__point = point
-        self.__edge_list = []
-        self.__x1_edge = None
-        self.__x2_edge = None
-        self.__y1_edge = None
-        self.__y2_edge = None
-        self.__z1_edge = None
-        self.__z2_edge = None
-        self.__is_terminal = False
+        # 座標は頻繁に参照されるので point を経由せずに読めるようにしておく．
+        self.x, self.y, self.z = point.xyz
+        self.__edge_list = None
+        self.__dir_edge_list = [None, None, None, None, None, None]
+        self.__adj_node_list = [None, None, None, None, None, None]
+        self.__adj_list = None
+        self.is_terminal = False
         self.__terminal_id = None
-        self.__is_via = False
+        self.is_via = False
         self.__via_id = None
+        self.is_block = False
+        self.kind = 0
 
     ### @brief 終端の印をつける．
     ### @param[in] net_id ネット番号
     def set_terminal(self, net_id) :
-        self.__is_terminal = True
+        self.is_terminal = True
         self.__terminal_id = net_id
+        self.is_block = True
+        self.kind = 1
 
     ### @brief ビアの印をつける．
     ### @param[in] via_id ビア番号
     def set_via(self, via_id) :
-        self.__is_via = True
+        self.is_via = True
         self.__via_id = via_id
+        self.is_block = True
+        self.kind = 2
 
     ### @brief 枝を追加する．
     ### @param[in] edge 対象の枝
@@ -64,55 +90,53 @@ class Node :
     ### - 3: 下(y2)
     ### - 4:   (z1)
     ### - 5:   (z2)
+    ###
+    ### 枝の node1 からは x2, y2, z2 (奇数)方向，node2 からは x1, y1, z1 (偶数)方向の
+    ### 枝として登録すること．
+    ### こうしておけば反対側のノードは方向番号の偶奇だけで決まる．
     def add_edge(self, edge, dir_id) :
-        self.__edge_list.append(edge)
-        if dir_id == 0 :
-            self.__x1_edge = edge
-        elif dir_id == 1 :
-            self.__x2_edge = edge
-        elif dir_id == 2 :
-            self.__y1_edge = edge
-        elif dir_id == 3 :
-            self.__y2_edge = edge
-        elif dir_id == 4 :
-            self.__z1_edge = edge
-        elif dir_id == 5 :
-            self.__z2_edge = edge
+        assert 0 <= dir_id < 6
+        if dir_id & 1 :
+            # sanity check
+            assert edge.node1 is self
+            alt_node = edge.node2
         else :
-            assert False
-
-    ### @brief ID番号
-    @property
-    def id(self) :
-        return self.__id
+            # sanity check
+            assert edge.node2 is self
+            alt_node = edge.node1
+        self.__dir_edge_list[dir_id] = edge
+        self.__edge_list = None
+        self.__adj_list = None
+        self.__adj_node_list[dir_id] = alt_node
 
     ### @brief 位置(point)
     @property
     def point(self) :
         return self.__point
 
-    ### @brief X座標
-    @property
-    def x(self) :
-        return self.__point.x
-
-    ### @brief Y座標
-    @property
-    def y(self) :
-        return self.__point.y
-
-    ### @brief Z座標
+    ### @brief 接続している枝のリストを返す
+    ###
+    ### 枝は方向番号の順(x1, x2, y1, y2, z1, z2)に並ぶ．
+    ### 最初に呼ばれた時に作って以降はそれを返す．
+    ### 内部のリストをそのまま返すので変更してはいけない．
     @property
-    def z(self) :
-        return self.__point.z
+    def edge_list(self) :
+        if self.__edge_list == None :
+            self.__edge_list = [edge for edge in self.__dir_edge_list if edge != None]
+        return self.__edge_list
 
-    ### @brief 接続している枝のリストのジェネレータを返す
+    ### @brief 接続している枝の ID 番号と反対側のノードの組のリストを返す
+    ###
+    ### 並び順は edge_list と同じ．
+    ### 経路をたどる時に枝ごとに alt_node() を呼ばずに済むように用意している．
+    ### 最初に呼ばれた時に作って以降はそれを返す．
+    ### 内部のリストをそのまま返すので変更してはいけない．
     @property
-    def edge_list(self) :
-        for edge in self.__edge_list :
-            # sanity check
-            assert edge.node1 == self or edge.node2 == self
-            yield edge
+    def adj_list(self) :
+        if self.__adj_list == None :
+            self.__adj_list = [(edge.id, node) for edge, node in zip(self.__dir_edge_list, self.__adj_node_list) \
+                               if edge != None]
+        return self.__adj_list
 
     ### @brief dir_id で指定された枝を返す．
     ###
@@ -123,63 +147,52 @@ class Node :
     ### - 3: 下(y2)
     ### - 4:   (z1)
     ### - 5:   (z2)
+    ###
+    ### 枝がない場合には None を返す．
     def edge(self, dir_id) :
-        if dir_id == 0 :
-            return self.__x1_edge
-        elif dir_id == 1 :
-            return self.__x2_edge
-        elif dir_id == 2 :
-            return self.__y1_edge
-        elif dir_id == 3 :
-            return self.__y2_edge
-        elif dir_id == 4 :
-            return self.__z1_edge
-        elif dir_id == 5 :
-            return self.__z2_edge
-        else :
-            assert False
+        return self.__dir_edge_list[dir_id]
 
     ### @brief x1方向の枝
     ###
     ### なければ None を返す．
     @property
     def x1_edge(self) :
-        return self.__x1_edge
+        return self.__dir_edge_list[0]
 
     ### @brief x2の枝
     ###
     ### なければ None を返す．
     @property
     def x2_edge(self) :
-        return self.__x2_edge
+        return self.__dir_edge_list[1]
 
     ### @brief y1方向の枝
     ###
     ### なければ None を返す．
     @property
     def y1_edge(self) :
-        return self.__y1_edge
+        return self.__dir_edge_list[2]
 
     ### @brief y2方向の枝
     ###
     ### なければ None を返す．
     @property
     def y2_edge(self) :
-        return self.__y2_edge
+        return self.__dir_edge_list[3]
 
     ### @brief z1方向の枝
     ###
     ### なければ None を返す．
     @property
     def z1_edge(self) :
-        return self.__z1_edge
+        return self.__dir_edge_list[4]
 
     ### @brief z2方向の枝
     ###
     ### なければ None を返す．
     @property
     def z2_edge(self) :
-        return self.__z2_edge
+        return self.__dir_edge_list[5]
 
     ### @brief 隣接するノードを返す．
     ### @param[in] dir_id 方向
@@ -191,43 +204,27 @@ class Node :
     ### - 3: 下(y2)
     ### - 4:   (z1)
     ### - 5:   (z2)
+    ###
+    ### 枝がない場合には None を返す．
     def adj_node(self, dir_id) :
-        edge = self.edge(dir_id)
-        if edge == None :
-            return None
-        return edge.alt_node(self)
-
-    ### @brief 終端フラグ
-    @property
-    def is_terminal(self) :
-        return self.__is_terminal
+        return self.__adj_node_list[dir_id]
 
     ### @brief 終端番号
     ###
     ### is_terminal == False の場合の値は不定
     @property
     def terminal_id(self) :
-        assert self.__is_terminal
+        assert self.is_terminal
         return self.__terminal_id
 
-    ### @brief ビアフラグ
-    @property
-    def is_via(self) :
-        return self.__is_via
-
     ### @brief ビア番号
     ###
     ### is_via == False の場合の値は不定
     @property
     def via_id(self) :
-        assert self.__is_via
+        assert self.is_via
         return self.__via_id
 
-    ### @brief 終端かビアのとき True となるフラグ
-    @property
-    def is_block(self) :
-        return self.__is_terminal or self.__is_via
-
     ### @brief 内容を表す文字列を返す．
     def str(self) :
         ans = '#{:04d}: {}'.format(self.id, self.point)
@@ -240,61 +237,48 @@ class Node :
 
         return ans
 
+    ### @brief デバッグ用の出力内容を表す文字列を返す．
+    ###
+    ### str() の内容に各方向の枝の ID 番号を加えたもの
+    def dump_str(self) :
+        ans = self.str()
+        for dir_name, edge in zip(('x1', 'x2', 'y1', 'y2', 'z1', 'z2'), self.__dir_edge_list) :
+            if edge :
+                ans += ' {}: #{:04d}'.format(dir_name, edge.id)
+        return ans
+
     ### @brief デバッグ用の出力
     def dump(self) :
-        print(self.str(), end='')
-        if self.x1_edge :
-            print(' x1: #{:04d}'.format(self.x1_edge.id), end='')
-        if self.x2_edge :
-            print(' x2: #{:04d}'.format(self.x2_edge.id), end='')
-        if self.y1_edge :
-            print(' y1: #{:04d}'.format(self.y1_edge.id), end='')
-        if self.y2_edge :
-            print(' y2: #{:04d}'.format(self.y2_edge.id), end='')
-        if self.z1_edge :
-            print(' z1: #{:04d}'.format(self.z1_edge.id), end='')
-        if self.z2_edge :
-            print(' z2: #{:04d}'.format(self.z2_edge.id), end='')
-        print('')
+        print(self.dump_str())
 
 
 ### @brief 枝を表すクラス
 ###
 ### 以下のメンバを持つ．
-### - ID番号
-### - 両端の節点(__node1, __node2)
+### - ID番号(id)
+### - 両端の節点(node1, node2)
+###
+### どのメンバも頻繁に参照されるので @property を介さない公開メンバにしている．
+### 読み出し専用として扱うこと．
 class Edge :
 
+    __slots__ = ('id', 'node1', 'node2')
+
     ### @brief 初期化
     ### @param[in] id ID番号
     ### @param[in] node1, node2 接続しているノード
     def __init__(self, id, node1, node2) :
-        self.__id = id
-        self.__node1 = node1
-        self.__node2 = node2
-
-    ### @brief ID番号
-    @property
-    def id(self) :
-        return self.__id
-
-    ### @brief ノード1
-    @property
-    def node1(self) :
-        return self.__node1
-
-    ### @brief ノード2
-    @property
-    def node2(self) :
-        return self.__node2
+        self.id = id
+        self.node1 = node1
+        self.node2 = node2
 
     ### @brief 反対側のノードを返す．
     ### @param[in] node 自分のノード
     def alt_node(self, node) :
-        if node == self.__node1 :
-            return self.__node2
-        elif node == self.__node2 :
-            return self.__node1
+        if node is self.node1 :
+            return self.node2
+        elif node is self.node2 :
+            return self.node1
         else :
             assert False
 
@@ -315,6 +299,52 @@ def guess_rule(problem) :
         return 'adc2016'
     return 'adc2017'
 
+### @brief 枝の両端の節点のインデックスと方向の表を作る．
+### @param[in] w, h, d 幅，高さ，深さ
+### @param[in] has_z_edge z 方向の枝を作る時 True にするフラグ
+### @return (node1 のインデックス, node2 のインデックス, 方向) のタプルを
+###         枝の ID 番号順に並べたタプルを返す．
+###
+### インデックスは Dimension.xyz_to_index() と同じ．
+### (x, y, z) のインデックスに対して x 方向の隣は +1,
+### y 方向の隣は +w, z 方向の隣は +w * h となる．
+### 方向の意味は以下の通り
+### - 0: x 方向
+### - 1: y 方向
+### - 2: z 方向
+###
+### 結果は盤面の大きさだけで決まるので，同じ大きさの問題を続けて解く時に
+### 使い回せるように最近の結果をキャッシュしておく．
+@functools.lru_cache(maxsize = 8)
+def make_edge_table(w, h, d, has_z_edge) :
+    wh = w * h
+    # 内側のループの y (z 方向の枝では z) はインデックスの等差数列になるので
+    # range() の刻み幅で表して掛け算を省いている．
+    edge_table = []
+    for z in range(0, d) :
+        zbase = z * wh
+        # x方向の枝を作る．
+        # (x, y, z) - (x + 1, y, z) を結ぶ枝
+        edge_table.extend([(index, index + 1, 0) \
+                           for x in range(0, w - 1) \
+                           for index in range(zbase + x, zbase + wh, w)])
+
+        # y方向の枝を作る．
+        # (x, y, z) - (x, y + 1, z) を結ぶ枝
+        edge_table.extend([(index, index + w, 1) \
+                           for x in range(0, w) \
+                           for index in range(zbase + x, zbase + wh - w, w)])
+
+    if has_z_edge :
+        # z 方向の枝を作る．
+        # (x, y, z) - (x, y, z + 1) を結ぶ枝
+        edge_table.extend([(index, index + wh, 2) \
+                           for x in range(0, w) \
+                           for y in range(0, h) \
+                           for index in range(y * w + x, (d - 1) * wh, wh)])
+
+    return tuple(edge_table)
+
 ### @brief ナンバーリンクの問題を表すグラフ
 ###
 ### ADC2015, ADC2016, ADC207 共用
@@ -358,109 +388,156 @@ class Graph :
             print('Graph.set_problem(): illegal rule: {} is assumed.'.format(rule))
         self.__rule = rule
 
+        # 盤面の大きさはループの中で何度も使うのでローカル変数にしておく．
+        w = dimension.width
+        h = dimension.height
+        d = dimension.depth
+
         # 節点を作る．
         # node_array[index] に (x, y, z) の節点が入る．
         # ただし index = dimension.xyz_to_index(x, y, z)
-        # Python 特有の内包表記で one-liner で書けるけど1行が長すぎ．
-        self.__node_array = [self.__new_node(index) for index in range(0, dimension.grid_size)]
+        # x が最も速く変わる順に作ればインデックスは作った順の番号と等しいので
+        # インデックスから座標を逆算する必要はない．
+        node_array = []
+        for z in range(0, d) :
+            for y in range(0, h) :
+                for x in range(0, w) :
+                    node_array.append(Node(len(node_array), Point(x, y, z)))
+        self.__node_array = node_array
 
         # 枝を作る．
-        self.__edge_list = []
-        for z in range(0, self.depth) :
-            # x方向の枝を作る．
-            for x in range(0, self.width - 1) :
-                for y in range(0, self.height) :
-                    # (x, y, z) - (x + 1, y, z) を結ぶ枝
-                    node1 = self.node(x    , y, z)
-                    node2 = self.node(x + 1, y, z)
-                    self.__new_edge(node1, node2, 0)
-
-            # y方向の枝を作る．
-            for x in range(0, self.width) :
-                for y in range(0, self.height - 1) :
-                    # (x, y, z) - (x, y + 1, z) を結ぶ枝
-                    node1 = self.node(x, y    , z)
-                    node2 = self.node(x, y + 1, z)
-                    self.__new_edge(node1, node2, 1)
-
-        if rule == 'adc2017' :
-            # z 方向の枝を作る．
-            for x in range(0, self.width) :
-                for y in range(0, self.height) :
-                    for z in range(0, self.depth - 1) :
-                        # (x, y, z) - (x, y, z + 1) を結ぶ枝
-                        node1 = self.node(x, y, z    )
-                        node2 = self.node(x, y, z + 1)
-                        self.__new_edge(node1, node2, 2)
+        # まず枝の両端の節点のインデックスと方向の表を得る．
+        # 表の並び順がそのまま枝の ID 番号になる．
+        edge_table = make_edge_table(w, h, d, rule == 'adc2017')
+
+        # 表に従って枝を作り両端の節点に登録する．
+        # node1 から見ると x2, y2, z2 方向，node2 から見ると x1, y1, z1 方向の枝になる．
+        # 同時に方向ごとの枝の ID 番号の表も作る．
+        # __edge_id_table[dir_id][node.id] に node から dir_id 方向に出る枝の ID 番号が入る．
+        # 枝がない時は -1 が入る．
+        nn = len(node_array)
+        edge_id_table = tuple([[-1] * nn for dir_id in range(0, 6)])
+        edge_list = [None] * len(edge_table)
+        for id, (index1, index2, dir_base) in enumerate(edge_table) :
+            node1 = node_array[index1]
+            node2 = node_array[index2]
+            edge = Edge(id, node1, node2)
+            edge_list[id] = edge
+            node1.add_edge(edge, dir_base * 2 + 1)
+            node2.add_edge(edge, dir_base * 2)
+            edge_id_table[dir_base * 2 + 1][index1] = id
+            edge_id_table[dir_base * 2][index2] = id
+        self.__edge_list = edge_list
+        self.__edge_id_table = edge_id_table
+
+        # ロの字を形作る枝の組を求めておく．
+        # __square_list[node.id] に node を左上とする４組の枝が入る．
+        # ロの字が作れない時は None が入る．
+        # グラフの形だけで決まるので一度求めておけば何度でも使える．
+        make_square = self.__make_square
+        self.__square_list = [make_square(node) for node in node_array]
+        # __square_id_list[node.id] には同じ枝の ID 番号のタプルが入る．
+        self.__square_id_list = [None if square == None else tuple([edge.id for edge in square]) \
+                                 for square in self.__square_list]
+        # 2x3, 2x4 マスの長方形の表は使われる時に作る．
+        # __rect_dict[(dir1, dir2, n)] に rect_list() の結果が入る．
+        self.__rect_dict = dict()
+
+        # 線分とビアのリストは何度もたどるので最初に取り出しておく．
+        net_list = list(problem.net_list())
+        via_list = list(problem.via_list())
 
         # 端子の印をつける．
-        self.__terminal_node_pair_list = []
-        for net_id, (label, s, e) in enumerate(problem.net_list()) :
-            node1 = self.node(s.x, s.y, s.z)
-            node2 = self.node(e.x, e.y, e.z)
+        node_from_point = self.node_from_point
+        terminal_node_pair_list = []
+        for net_id, (label, s, e) in enumerate(net_list) :
+            node1 = node_from_point(s)
+            node2 = node_from_point(e)
             node1.set_terminal(net_id)
             node2.set_terminal(net_id)
-            self.__terminal_node_pair_list.append((node1, node2))
+            terminal_node_pair_list.append((node1, node2))
+
+        # 異なる線分の終端どうしを結ぶ枝は決して選ばれない．
+        # __dead_edge_list[edge.id] が True の時その枝は選ばれない．
+        dead_edge_list = [False for edge in edge_list]
+        for node1, node2 in terminal_node_pair_list :
+            for node in (node1, node2) :
+                net_id = node.terminal_id
+                for edge_id, alt_node in node.adj_list :
+                    if alt_node.is_terminal and alt_node.terminal_id != net_id :
+                        dead_edge_list[edge_id] = True
+        self.__dead_edge_list = dead_edge_list
+        self.__terminal_node_pair_list = terminal_node_pair_list
 
         if rule == 'adc2016' :
             # 各層ごとに現れるネット番号のリストを作る．
-            self.__terminal_node_pair_list = []
-            self.__multi_net_list = []
-            self.__multi_net_id_map = [-1 for (label, s, e) in problem.net_list()]
-            self.__net_id_list = [[] for z in range(0, self.depth)]
-            for net_id, (label, s, e) in enumerate(problem.net_list()) :
-                node1 = self.node(s.x, s.y, s.z)
-                node2 = self.node(e.x, e.y, e.z)
-                node1.set_terminal(net_id)
-                node2.set_terminal(net_id)
-                self.__terminal_node_pair_list.append((node1, node2))
-                self.__net_id_list[s.z].append(net_id)
+            # 端子の印と __terminal_node_pair_list は上で作ったものをそのまま使う．
+            multi_net_list = []
+            multi_net_id_map = [-1 for net in net_list]
+            net_id_list = [[] for z in range(0, d)]
+            for net_id, (label, s, e) in enumerate(net_list) :
+                net_id_list[s.z].append(net_id)
                 if s.z != e.z :
-                    multi_net_id = len(self.__multi_net_list)
-                    self.__multi_net_id_map[net_id] = multi_net_id
-                    self.__multi_net_list.append(net_id)
-                    self.__net_id_list[e.z].append(net_id)
+                    multi_net_id_map[net_id] = len(multi_net_list)
+                    multi_net_list.append(net_id)
+                    net_id_list[e.z].append(net_id)
+            self.__multi_net_list = multi_net_list
+            self.__multi_net_id_map = multi_net_id_map
+            self.__net_id_list = net_id_list
 
             # __net_id_list の最大値がラベル数となる．
             max_num = 0
-            for z in range(0, self.depth) :
-                num = len(self.__net_id_list[z])
+            for z in range(0, d) :
+                num = len(net_id_list[z])
                 if max_num < num :
                     max_num = num
             self.__label_num = max_num
 
             # (ネット番号, 層番号)とラベルの対応付けを行う．
-            self.__label_matrix = [[-1 for z in range(0, self.depth)] for d in range(0, self.net_num)]
-            for z in range(0, self.depth) :
-                for label, net_id in enumerate(self.__net_id_list[z]) :
-                    self.__label_matrix[net_id][z] = label
+            # 同じ層でネット番号を変えながら引くことが多いので
+            # __label_matrix[z][net_id] の順に格納する．
+            nn = self.net_num
+            label_matrix = [[-1 for net_id in range(0, nn)] for z in range(0, d)]
+            for z in range(0, d) :
+                label_list = label_matrix[z]
+                for label, net_id in enumerate(net_id_list[z]) :
+                    label_list[net_id] = label
+            self.__label_matrix = label_matrix
 
             # ビアの印をつける．
             self.__via_nodes_list = [[] for via_id in range(0, self.via_num)]
-            for via_id, via in enumerate(problem.via_list()) :
+            for via_id, via in enumerate(via_list) :
                 via_nodes = []
-                for z in range(via.z1, via.z2 - via.z1 + 1) :
-                    node = self.node(via.x, via.y, z)
+                for z in range(via.z1, via.z2 + 1) :
+                    node = node_array[dimension.xyz_to_index(via.x, via.y, z)]
                     node.set_via(via_id)
                     via_nodes.append(node)
-                self.__via_nodes_list[via_id] = via_nodes
+                self.__via_nodes_list[via_id] = tuple(via_nodes)
 
             # ビアを使うことのできるネットを求める．
             # 条件はネットの２つの終端の層番号をそのビアが含んでいること．
             # ただし2つの終端の層番号が等しいネットは除外する．
-            # __via_net_list[via_id] に via_id と関係のある線分番号のリストが入る．
-            # __net_via_list[net_id] に net_id と関係のあるビア番号のリストが入る．
-            self.__via_net_list = [[] for via_id in range(0, self.via_num)]
-            self.__net_via_list = [[] for net_id in range(0, self.net_num)]
-            for via_id, via in enumerate(problem.via_list()) :
+            # __via_net_list[via_id] に via_id と関係のある線分番号のタプルが入る．
+            # __net_via_list[net_id] に net_id と関係のあるビア番号のタプルが入る．
+            # どちらも作った後は変更しないのでタプルにしておく．
+            # 候補となるのは２つの終端の層番号が異なるネットだけなので
+            # それらの (ネット番号, 小さい方の層番号, 大きい方の層番号) を先に求めておく．
+            # ビアが両方の層を含むことは z1 <= 小さい方 かつ 大きい方 <= z2 と等しい．
+            cand_list = []
+            for net_id, (label, s, e) in enumerate(net_list) :
+                if s.z != e.z :
+                    cand_list.append((net_id, min(s.z, e.z), max(s.z, e.z)))
+            via_net_list = [None for via_id in range(0, self.via_num)]
+            net_via_list = [[] for net_id in range(0, nn)]
+            for via_id, via in enumerate(via_list) :
                 z1 = via.z1
                 z2 = via.z2
-                net_list = []
-                for net_id, (label, s, e) in enumerate(problem.net_list()) :
-                    if s.z != e.z and z1 <= s.z <= z2 and z1 <= e.z <= z2 :
-                        net_list.append(net_id)
-                        self.__net_via_list[net_id].append(via_id)
-                self.__via_net_list[via_id] = net_list
+                net_tuple = tuple([net_id for net_id, lo, hi in cand_list if z1 <= lo and hi <= z2])
+                for net_id in net_tuple :
+                    net_via_list[net_id].append(via_id)
+                via_net_list[via_id] = net_tuple
+            self.__via_net_list = via_net_list
+            self.__net_via_list = [tuple(via_ids) for via_ids in net_via_list]
 
     ### @brief 問題の形式
     @property
@@ -512,6 +589,15 @@ class Graph :
     def edge_list(self) :
         return self.__edge_list
 
+    ### @brief 決して選ばれない枝の印のリストを返す．
+    ###
+    ### 異なる線分の終端どうしを結ぶ枝は選ばれることがないので
+    ### その枝の ID 番号の位置が True になっている．
+    ### 内部のリストをそのまま返すので変更してはいけない．
+    @property
+    def dead_edge_list(self) :
+        return self.__dead_edge_list
+
     ### @brief 端点のノード対を返す．
     ### @param[in] net_id 線分番号
     def terminal_node_pair(self, net_id) :
@@ -531,23 +617,31 @@ class Graph :
     ###
     ### その層にない線分番号の場合には -1 を返す．
     def label(self, net_id, z) :
-        return self.__label_matrix[net_id][z]
+        return self.__label_matrix[z][net_id]
+
+    ### @brief 層ごとの線分番号に対するラベルのリストを返す．
+    ### @param[in] z 層番号
+    ###
+    ### layer_label_list(z)[net_id] は label(net_id, z) と等しい．
+    ### 同じ層で多数の線分のラベルを引く時に用いる．
+    def layer_label_list(self, z) :
+        return self.__label_matrix[z]
 
-    ### @brief ネットに関係するビア番号のリストを返す．
+    ### @brief ネットに関係するビア番号のタプルを返す．
     ### @param[in] net_id 線分番号
     ###
     ### has_via == True の時のみ意味を持つ．
     def net_via_list(self, net_id) :
         return self.__net_via_list[net_id]
 
-    ### @brief ビアのノードリストを返す．
+    ### @brief ビアのノードのタプルを返す．
     ### @param[in] via_id ビア番号
     ###
     ### has_via == True の時のみ意味を持つ．
     def via_node_list(self, via_id) :
         return self.__via_nodes_list[via_id]
 
-    ### @brief ビアに関係する線分番号のリストを返す．
+    ### @brief ビアに関係する線分番号のタプルを返す．
     ### @param[in] via_id ビア番号
     ###
     ### has_via == True の時のみ意味を持つ．
@@ -585,57 +679,123 @@ class Graph :
     ### 列挙するジェネレータを返す．
     @property
     def square_edges(self) :
+        for square in self.__square_list :
+            if square != None :
+                yield square
+
+    ### @brief node_00 を左上とするロの字の４組の枝を返す．
+    ### @param[in] node_00 左上の節点
+    ###
+    ### 枝の位置関係は square_edges と同じ．
+    ### ロの字が作れない時は None を返す．
+    def square_edge(self, node_00) :
+        return self.__square_list[node_00.id]
+
+    ### @brief node_00 を左上とするロの字の４組の枝の ID 番号を返す．
+    ### @param[in] node_00 左上の節点
+    ###
+    ### square_edge() の枝の代わりに枝の ID 番号のタプルを返す．
+    ### ロの字が作れない時は None を返す．
+    def square_edge_ids(self, node_00) :
+        return self.__square_id_list[node_00.id]
+
+    ### @brief dir_id 方向の枝の ID 番号の表を返す．
+    ### @param[in] dir_id 方向 (Node.edge() と同じ意味)
+    ###
+    ### 結果のリストの node.id 番目の要素は node.edge(dir_id) の ID 番号となる．
+    ### 枝がない時は -1 が入る．
+    ### 節点ごとに Node.edge() を呼ばずに ID 番号を直接引くために用いる．
+    ### 内部のリストをそのまま返すので変更してはいけない．
+    def edge_id_list(self, dir_id) :
+        return self.__edge_id_table[dir_id]
+
+    ### @brief node_00 を左上とする 2 x (n + 1) の長方形の表を返す．
+    ### @param[in] dir1 長辺の方向 (1 か 3)
+    ### @param[in] dir2 短辺の方向 (3 か 1)
+    ### @param[in] n 長辺の枝の数
+    ###
+    ### node_00 -- e_0 -- node_10 -- ... -- node_n0
+    ###    |                                   |
+    ###   e_l                                 e_r
+    ###    |                                   |
+    ### node_01 -- f_0 -- node_11 -- ... -- node_n1
+    ###
+    ### 結果のリストの node_00.id 番目の要素は
+    ### (上辺の節点のタプル, 下辺の節点のタプル,
+    ###  e_0 .. e_n-1 の ID 番号のタプル, f_0 .. f_n-1 の ID 番号のタプル,
+    ###  e_l の ID 番号, e_r の ID 番号)
+    ### となる．長方形が作れない時は None が入る．
+    ### グラフの形だけで決まるので一度作った表は保持しておく．
+    def rect_list(self, dir1, dir2, n) :
+        key = (dir1, dir2, n)
+        rect_list = self.__rect_dict.get(key)
+        if rect_list == None :
+            rect_list = [self.__make_rect(node, dir1, dir2, n) for node in self.__node_array]
+            self.__rect_dict[key] = rect_list
+        return rect_list
+
+    ### @brief rect_list() の要素を作る．
+    ### @param[in] node_00 左上の節点
+    ### @param[in] dir1 長辺の方向
+    ### @param[in] dir2 短辺の方向
+    ### @param[in] n 長辺の枝の数
+    def __make_rect(self, node_00, dir1, dir2, n) :
+        edge_l = node_00.edge(dir2)
+        if edge_l == None :
+            return None
+        upper_nodes = [node_00]
+        upper_ids = []
+        node = node_00
+        for i in range(0, n) :
+            edge = node.edge(dir1)
+            if edge == None :
+                return None
+            upper_ids.append(edge.id)
+            node = node.adj_node(dir1)
+            upper_nodes.append(node)
+        edge_r = node.edge(dir2)
+        assert edge_r != None
+        node = node_00.adj_node(dir2)
+        lower_nodes = [node]
+        lower_ids = []
+        for i in range(0, n) :
+            edge = node.edge(dir1)
+            assert edge != None
+            lower_ids.append(edge.id)
+            node = node.adj_node(dir1)
+            lower_nodes.append(node)
+        return tuple(upper_nodes), tuple(lower_nodes), tuple(upper_ids), tuple(lower_ids), edge_l.id, edge_r.id
+
+    ### @brief square_edge() の結果を作る．
+    ### @param[in] node_00 左上の節点
+    def __make_square(self, node_00) :
         dir1 = 1
         dir2 = 3
-        for node_00 in self.__node_array :
-            edge1 = node_00.edge(dir1)
-            if edge1 == None :
-                continue
-            edge2 = node_00.edge(dir2)
-            if edge2 == None :
-                continue
-            node_10 = edge1.alt_node(node_00)
-            assert node_10 != None
-            node_01 = edge2.alt_node(node_00)
-            assert node_01 != None
-            edge3 = node_10.edge(dir2)
-            assert edge3 != None
-            edge4 = node_01.edge(dir1)
-            assert edge4 != None
-            yield edge1, edge2, edge3, edge4
-
-    ### @brief 枝を作る．
-    ### @param[in] node1, node2 両端の節点
-    ### @param[in] dir_base 方向を表す数字
-    ###
-    ### dir_base の意味は以下の通り
-    ### - 0: x 方向
-    ### - 1: y 方向
-    ### - 2: z 方向
-    def __new_edge(self, node1, node2, dir_base) :
-        id = len(self.__edge_list)
-        edge = Edge(id, node1, node2)
-        self.__edge_list.append(edge)
-        dir1 = dir_base * 2 + 0
-        dir2 = dir_base * 2 + 1
-        node1.add_edge(edge, dir2)
-        node2.add_edge(edge, dir1)
-
-    ### @brief ノードを作る．
-    ### @param[in] index インデックス番号
-    def __new_node(self, index) :
-        point = self.__dim.index_to_point(index)
-        return Node(index, point)
+        edge1 = node_00.edge(dir1)
+        if edge1 == None :
+            return None
+        edge2 = node_00.edge(dir2)
+        if edge2 == None :
+            return None
+        node_10 = node_00.adj_node(dir1)
+        assert node_10 != None
+        node_01 = node_00.adj_node(dir2)
+        assert node_01 != None
+        edge3 = node_10.edge(dir2)
+        assert edge3 != None
+        edge4 = node_01.edge(dir1)
+        assert edge4 != None
+        return edge1, edge2, edge3, edge4
 
     ### @brief 内容を出力する．
+    ###
+    ### 行ごとに出力せずに全体を一つの文字列にまとめてから一度に出力する．
     def dump(self) :
-        print('Nodes:')
-        for node in self.__node_array :
-            node.dump()
-
-        print('')
-        print('Edges:')
-        for edge in self.__edge_list :
-            edge.dump()
+        lines = ['Nodes:']
+        lines.extend([node.dump_str() for node in self.__node_array])
+        lines.append('')
+        lines.append('Edges:')
+        lines.extend([edge.str() for edge in self.__edge_list])
+        print('\n'.join(lines))
 
 # end of graph.py
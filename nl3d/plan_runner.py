@@ -0,0 +1,145 @@
+#! /usr/bin/env python3
+
+### @file plan_runner.py
+### @brief run_plans() の定義ファイル
+### @author Yusuke Matsunaga (松永 裕介)
+###
+### Copyright (C) 2017 Yusuke Matsunaga
+### All rights reserved.
+
+import multiprocessing
+import os
+import sys
+import traceback
+from queue import Empty
+
+
+### @brief 複数の戦略を並列に実行する．
+### @param[in] plan_list 戦略(plan_A() などの関数)のリスト
+### @param[in] graph 問題を表すグラフ(Graph)
+### @param[in] var_limit 変数の数の上限
+### @param[in] binary_encoding ラベルを binary 符号化する時 True にするフラグ
+### @return status, solution のタプルを返す．
+###
+### 戦略ごとに子プロセスを作って実行し，最初に 'OK' を返したものの結果を返す．
+### その時点でまだ動いている子プロセスは打ち切る．
+### どれも 'OK' でなければ plan_list の最後の戦略の結果を返す．
+### 結果を返さずに終了した子プロセスの戦略は 'Abort' とみなす．
+###
+### 子プロセスは fork で作るので graph を pickle する必要はない．
+### 子プロセスから返す解(Solution)だけが pickle される．
+### fork が使えない環境や CPU が1つしかない場合は plan_list の順に実行する．
+def run_plans(plan_list, graph, var_limit, binary_encoding) :
+    if len(plan_list) < 2 or (os.cpu_count() or 1) < 2 or \
+       'fork' not in multiprocessing.get_all_start_methods() :
+        for plan in plan_list :
+            status, solution = plan(graph, var_limit, binary_encoding)
+            if status == 'OK' :
+                break
+        return status, solution
+
+    # fork の前に出力を吐き出しておかないと子プロセスでも同じ内容が出力される．
+    sys.stdout.flush()
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    proc_list = []
+    for plan_id, plan in enumerate(plan_list) :
+        proc = ctx.Process(target = _run_plan,
+                           args = (queue, plan_id, plan, graph, var_limit, binary_encoding))
+        proc.start()
+        proc_list.append(proc)
+
+    # 結果は終わった順に届く．
+    # 子プロセスが結果を送らずに終了した場合(シグナルや BaseException)
+    # に待ち続けないよう，時間を区切って待ちながら子プロセスの終了を調べる．
+    # 終了を見つけた時点ではその直前に送られた結果がまだ届いていないことが
+    # あるので，もう一度待っても届かなかった時に 'Abort' とみなす．
+    result_list = [None for plan in plan_list]
+    exited_list = []
+    try :
+        while None in result_list :
+            try :
+                plan_id, status, solution = queue.get(timeout = 1.0)
+            except Empty :
+                for plan_id in exited_list :
+                    if result_list[plan_id] == None :
+                        print('{}: exited without a result (exitcode = {})'.format(
+                            plan_list[plan_id].__name__, proc_list[plan_id].exitcode),
+                              file = sys.stderr)
+                        result_list[plan_id] = 'Abort', None
+                exited_list = [plan_id for plan_id, proc in enumerate(proc_list) \
+                               if proc.exitcode != None]
+                continue
+            result_list[plan_id] = status, solution
+            if status == 'OK' :
+                return status, solution
+    finally :
+        for proc in proc_list :
+            if proc.is_alive() :
+                proc.terminate()
+            proc.join()
+
+    return result_list[-1]
+
+
+### @brief run_plans() の子プロセスで実行される関数
+### @param[in] queue 結果を返すためのキュー
+### @param[in] plan_id 戦略の番号
+### @param[in] plan 戦略
+### @param[in] graph, var_limit, binary_encoding 戦略に渡す引数
+###
+### 例外が起きた時はトレースバックを出力して 'Abort' を返す．
+### 複数の子プロセスの出力が混ざっても区別できるように
+### 標準出力と標準エラー出力の各行の先頭に戦略の名前を付ける．
+def _run_plan(queue, plan_id, plan, graph, var_limit, binary_encoding) :
+    prefix = '[{}] '.format(plan.__name__)
+    sys.stdout = _PrefixWriter(prefix, sys.stdout)
+    sys.stderr = _PrefixWriter(prefix, sys.stderr)
+    try :
+        status, solution = plan(graph, var_limit, binary_encoding)
+    except Exception :
+        traceback.print_exc()
+        status, solution = 'Abort', None
+    finally :
+        sys.stdout.close()
+        sys.stderr.close()
+    queue.put((plan_id, status, solution))
+
+
+### @brief 各行の先頭に文字列を付けて出力するファイルもどき
+###
+### 行単位でまとめて書き出すので，他のプロセスの出力と行の途中で混ざることはない．
+### 改行で終わっていない部分は次の改行か close() まで溜めておく．
+class _PrefixWriter :
+
+    ### @brief 初期化
+    ### @param[in] prefix 各行の先頭に付ける文字列
+    ### @param[in] fout 出力先のファイル
+    def __init__(self, prefix, fout) :
+        self.__prefix = prefix
+        self.__fout = fout
+        self.__buf = ''
+
+    ### @brief 文字列を書き込む．
+    def write(self, s) :
+        line_list = (self.__buf + s).split('\n')
+        self.__buf = line_list.pop()
+        if len(line_list) > 0 :
+            prefix = self.__prefix
+            self.__fout.write(''.join([prefix + line + '\n' for line in line_list]))
+            self.__fout.flush()
+        return len(s)
+
+    ### @brief 出力先を flush する．
+    def flush(self) :
+        self.__fout.flush()
+
+    ### @brief 溜めてある部分を書き出す．
+    ###
+    ### 出力先のファイルは閉じない．
+    def close(self) :
+        if self.__buf != '' :
+            self.write('\n')
+        self.__fout.flush()
+
+# end of plan_runner.py
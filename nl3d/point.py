@@ -20,8 +20,13 @@
 ### @endcode
 ###
 ### という風に使う．
+###
+### 経路の座標などで大量に作られるので __slots__ でメンバを固定して
+### インスタンスごとの辞書を持たないようにしている．
 class Point :
 
+    __slots__ = ('__x', '__y', '__z')
+
     ### @brief 初期化
     ### @param x, y, z 座標の値
     def __init__(self, x = 0, y = 0, z = 0) :
@@ -189,7 +189,7 @@ class Problem :
     ### なければ None を返す．
     def via(self, label) :
         if label in self.__via_dict :
-            return __via_dict[label]
+            return self.__via_dict[label]
         else :
             return None
 
@@ -49,6 +49,18 @@ class Solution :
         index = self.__dim.point_to_index(point)
         self.__grid_array[index] = val
 
+    ### @brief 1行分のマス目の値をまとめて設定する．
+    ### @param[in] y, z 行の Y座標と Z座標
+    ### @param[in] val_list X座標の順に並んだ値のリスト
+    ###
+    ### 1行分のマス目は __grid_array 上で連続しているので
+    ### マス目ごとに set_val() を呼ばずにスライスに代入する．
+    def set_row(self, y, z, val_list) :
+        assert self.__dim.range_check(0, y, z)
+        assert len(val_list) == self.__dim.width
+        base = self.__dim.xyz_to_index(0, y, z)
+        self.__grid_array[base:base + len(val_list)] = val_list
+
     ### @brief サイズ(Dimension)
     @property
     def dimension(self) :
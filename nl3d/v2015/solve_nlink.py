@@ -8,6 +8,7 @@
 # All rights reserved.
 
 from nl3d.v2015.cnfencoder import CnfEncoder
+from nl3d.plan_runner import run_plans
 
 
 ## @brief 問題を表すCNF式を生成する．
@@ -19,28 +20,10 @@ from nl3d.v2015.cnfencoder import CnfEncoder
 # それ以外は None
 def solve_nlink(graph, var_limit, binary_encoding) :
 
+    # plan_A と plan_B11 以降の戦略は並列に実行して先に解けた方の結果を使う．
+    # plan_B11, plan_B10, plan_B01, plan_C は一つの CNF式を使い回す．
     print('plan_A(v2015)')
-    status, solution = plan_A(graph, var_limit, binary_encoding)
-    if status == 'OK' :
-        return status, solution
-
-    print('plan_B11(v2015)')
-    status, solution = plan_B11(graph, var_limit, binary_encoding)
-    if status == 'OK' :
-        return status, solution
-
-    print('plan_B10(v2015)')
-    status, solution = plan_B10(graph, var_limit, binary_encoding)
-    if status == 'OK' :
-        return status, solution
-
-    print('plan_B01(v2015)')
-    status, solution = plan_B01(graph, var_limit, binary_encoding)
-    if status == 'OK' :
-        return status, solution
-
-    print('plan_C(v2015)')
-    status, solution = plan_C(graph, var_limit, binary_encoding)
+    status, solution = run_plans([plan_A, plan_B], graph, var_limit, binary_encoding)
     if status == 'OK' :
         return status, solution
 
@@ -64,27 +47,13 @@ def plan_A(graph, var_limit, binary_encoding) :
     return enc.solve(var_limit)
 
 
-## @brief 最も簡単な戦略
-def plan_B11(graph, var_limit, binary_encoding) :
-
-    solver_type = 'glueminisat2'
-
-    # 問題を表す CNF式を生成する．
-    enc = CnfEncoder(graph, solver_type, binary_encoding)
-
-    enc.make_base_constraint(False)
-    enc.make_lshape_constraint()
-    enc.make_yshape_constraint()
-
-    #enc.make_wshape_constraint()
-    #enc.make_w2shape_constraint()
-
-    # 問題を解く．
-    return enc.solve(var_limit)
-
-
-## @brief 最も簡単な戦略
-def plan_B10(graph, var_limit, binary_encoding) :
+## @brief plan_B11, plan_B10, plan_B01, plan_C を順に試す戦略
+#
+# 4つの戦略は L字制約と Y字制約を入れるかどうかだけが異なる．
+# そこでそれぞれの制約を切り替え用の変数が真の時だけ有効にして
+# CNF式を一度だけ作り，仮定を変えて解き直す．
+# SATソルバが学習した節も次の戦略に引き継がれる．
+def plan_B(graph, var_limit, binary_encoding) :
 
     solver_type = 'glueminisat2'
 
@@ -92,45 +61,24 @@ def plan_B10(graph, var_limit, binary_encoding) :
     enc = CnfEncoder(graph, solver_type, binary_encoding)
 
     enc.make_base_constraint(False)
+    lvar = enc.new_switch()
+    enc.begin_switch(lvar)
     enc.make_lshape_constraint()
-
-    #enc.make_wshape_constraint()
-    #enc.make_w2shape_constraint()
-
-    # 問題を解く．
-    return enc.solve(var_limit)
-
-
-## @brief 最も簡単な戦略
-def plan_B01(graph, var_limit, binary_encoding) :
-
-    solver_type = 'glueminisat2'
-
-    # 問題を表す CNF式を生成する．
-    enc = CnfEncoder(graph, solver_type, binary_encoding)
-
-    enc.make_base_constraint(False)
+    enc.end_switch()
+    yvar = enc.new_switch()
+    enc.begin_switch(yvar)
     enc.make_yshape_constraint()
-
-    #enc.make_wshape_constraint()
-    #enc.make_w2shape_constraint()
+    enc.end_switch()
 
     # 問題を解く．
-    return enc.solve(var_limit)
-
-
-## @brief 最も簡単な戦略
-def plan_C(graph, var_limit, binary_encoding) :
-
-    solver_type = 'glueminisat2'
-
-    # 問題を表す CNF式を生成する．
-    enc = CnfEncoder(graph, solver_type, binary_encoding)
-
-    enc.make_base_constraint(False)
-
-    #enc.make_wshape_constraint()
-    #enc.make_w2shape_constraint()
-
-    # 問題を解く．
-    return enc.solve(var_limit)
+    # 戦略ごとに名前と仮定するリテラルのリストを並べておき，順に解く．
+    plan_list = (('plan_B11(v2015)', [lvar, yvar]),
+                 ('plan_B10(v2015)', [lvar, ~yvar]),
+                 ('plan_B01(v2015)', [~lvar, yvar]),
+                 ('plan_C(v2015)', [~lvar, ~yvar]))
+    for name, assumption_list in plan_list :
+        print(name)
+        status, solution = enc.solve(var_limit, assumption_list)
+        if status == 'OK' :
+            break
+    return status, solution
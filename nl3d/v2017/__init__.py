@@ -7,4 +7,4 @@
 ### Copyright (C) 2017 Yusuke Matsunaga
 ### All rights reserved.
 
-from nl3d.v2017.solve_nlink import solve_nlink
+from nl3d.v2017.solve_nlink import solve_nlink, write_dimacs
@@ -7,9 +7,9 @@
 ### Copyright (C) 2017 Yusuke Matsunaga
 ### All rights reserved.
 
-import math
 import time
 from nl3d.router import Router
+from nl3d.dimacs_writer import DimacsWriter
 from pym_sat import SatSolver, Bool3
 
 
@@ -24,8 +24,13 @@ class CnfEncoder :
     ### @param[in] binary_encoding ノードラベル変数を２進符号化する時 True にするフラグ
     ###
     ### ここではSATの変数の割当のみ行う．
+    ### solver_type が 'dimacs' の時はSATソルバの代わりに DimacsWriter を用いる．
+    ### この場合 solve() は使えず，export_dimacs() で CNF式を書き出す．
     def __init__(self, graph, solver_type, binary_encoding) :
-        solver = SatSolver(solver_type)
+        if solver_type == 'dimacs' :
+            solver = DimacsWriter()
+        else :
+            solver = SatSolver(solver_type)
         self.__graph = graph
         self.__solver = solver
         self.__binary_encoding = binary_encoding
@@ -41,60 +46,91 @@ class CnfEncoder :
         # 結果は edge_var_list に格納する．
         # __edge_var_list[edge.id] に edge に対応する変数が入る．
         # 実際にはその変数に対応するリテラルを入れる．
-        self.__edge_var_list = [solver.new_variable() for edge in graph.edge_list]
+        self.__edge_var_list = self.__new_variables(len(graph.edge_list))
 
         # 節点のラベルを表す変数のリストを作る．
         # 節点のラベルは log2(nn + 1) 個の変数で表す(binaryエンコーディング)
-        # 結果は __node_vars_list に格納する．
-        # __node_vars_list[node.id] に node に対応する変数のリストが入る．
+        # 結果は __node_var_array に格納する．
+        # 全節点分の変数を一つの配列に並べて持つ．
+        # __node_var_array[node.id * __node_var_num + i] に node の i 番目の変数が入る．
         # 実際にはその変数に対応するリテラルを入れる．
         nn = graph.net_num
-        if self.__binary_encoding :
-            nn_log2 = math.ceil(math.log2(nn + 1))
-            self.__node_vars_list = [[solver.new_variable() for i in range(0, nn_log2)] \
-                                     for node in graph.node_list]
+        # binary 符号化でラベルが1種類しかない時は異なるラベルの経路が
+        # 接することはないのでラベル変数は作らない．
+        # one-hot 符号化の時は枝が選ばれていない時に両端のラベルが
+        # 等しくないという制約がラベル1種類でも意味を持つので変数を作る．
+        if nn <= 1 and self.__binary_encoding :
+            self.__node_var_num = 0
+        elif self.__binary_encoding :
+            self.__node_var_num = nn.bit_length()
         else :
-            self.__node_vars_list = [[solver.new_variable() for i in range(0, nn)] \
-                                     for node in graph.node_list]
-
-        if not no_slack and False :
-            # 節点が使われている時 True になる変数を用意する．
-            self.__uvar_list = [solver.new_variable() for node in graph.node_list]
+            self.__node_var_num = nn
+        nv = len(graph.node_list) * self.__node_var_num
+        self.__node_var_array = self.__new_variables(nv)
 
-        # 各節点に対して隣接する枝の条件を作る．
+        # ラベル値を固定する時の各変数の極性をあらかじめ求めておく．
+        # __label_pattern_list[label][i] が True の時 i 番目の変数が肯定となる．
+        k = self.__node_var_num
+        if self.__binary_encoding :
+            self.__label_pattern_list = [tuple([((1 << i) & (label + 1)) != 0 for i in range(0, k)]) for label in range(0, nn)]
+        else :
+            self.__label_pattern_list = [tuple([i == label for i in range(0, k)]) for label in range(0, nn)]
+
+        # one-hot 符号化の時は隣接ノードの制約で否定リテラルを何度も使うので
+        # あらかじめ作っておく．
+        # __node_nvar_array[k] は __node_var_array[k] の否定リテラル．
+        if not self.__binary_encoding :
+            self.__node_nvar_array = [~var for var in self.__node_var_array]
+
+        # 各節点に対して以下の制約をまとめて作る．
+        # - 隣接する枝の条件
+        # - 節点から x2, y2, z2 方向に出る枝が選択された時にその両端の
+        #   ノードのラベルが等しくなるという制約
+        #   (どの枝もちょうど一つの節点の x2, y2, z2 方向の枝になっている)
+        # - 節点を左上とするU字制約
+        # こうすることで節点と枝をそれぞれ一度たどるだけで済む．
+        # 節点の種類(node.kind)ごとの枝の制約を作る関数の表
+        # この問題の形式にはビアがないので終端(kind == 1)までしか使わない．
+        edge_constraint_table = (self.__make_edge_constraint,
+                                 self.__make_terminal_edge_constraint)
+        # 符号化方法による場合分けはここで一度だけ行う．
+        if self.__binary_encoding :
+            make_adj_nodes_constraint = self.__make_adj_nodes_constraint
+        else :
+            make_adj_nodes_constraint = self.__make_adj_nodes_constraint_onehot
+        edge_var_list = self.__edge_var_list
+        # 決して選ばれない枝(異なる線分の終端どうしを結ぶ枝)の変数は False に固定する．
+        # そのような枝については両端のラベルに関する制約は作らず，
+        # U字制約からも除いておく．
+        dead_edge_list = graph.dead_edge_list
+        for edge_id, dead in enumerate(dead_edge_list) :
+            if dead :
+                solver.add_clause([~edge_var_list[edge_id]])
+        # ラベル変数がない時は枝の両端のラベルに関する制約も作らない．
+        use_label = self.__node_var_num > 0
+        # U字制約は下請け関数を呼ばずにここで直接作る．
+        # 節点を左上とする1マスの4本の枝のうち3本以上が同時に使われる
+        # 経路は存在しない．
+        add_at_most_two = solver.add_at_most_two
+        square_edge_ids = graph.square_edge_ids
         for node in graph.node_list :
-            self.__make_edge_constraint(node, no_slack)
-
-        # 枝が選択された時にその両端のノードのラベルが等しくなるという制約を作る．
-        for edge in graph.edge_list :
-            self.__make_adj_nodes_constraint(edge)
-
-        # U字制約を作る．
-        self.make_ushape_constraint()
-
-    ### @brief U字(コの字)制約を作る．
-    ###
-    ### node_00 -- edge1 -- node_10
-    ###    |                   |
-    ###    |                   |
-    ###  edge2               edge3
-    ###    |                   |
-    ###    |                   |
-    ### node_01 -- edge4 -- node_11
-    ###
-    ### edge1, edge2, edge3, edge4 の３つ以上が同時に使われる
-    ### 経路は存在しない．
-    ###
-    ### これを3方向で行う．
-    def make_ushape_constraint(self) :
-        graph = self.__graph
-        solver = self.__solver
-        for edge1, edge2, edge3, edge4 in graph.square_edges :
-            var1 = self.edge_var(edge1)
-            var2 = self.edge_var(edge2)
-            var3 = self.edge_var(edge3)
-            var4 = self.edge_var(edge4)
-            solver.add_at_most_two([var1, var2, var3, var4])
+            # node に接続している枝の変数のリスト
+            evar_list = [edge_var_list[edge.id] for edge in node.edge_list]
+            edge_constraint_table[node.kind](node, evar_list, no_slack)
+            if use_label :
+                for edge in (node.x2_edge, node.y2_edge, node.z2_edge) :
+                    if edge != None and not dead_edge_list[edge.id] :
+                        make_adj_nodes_constraint(edge)
+            square_ids = square_edge_ids(node)
+            if square_ids != None :
+                id1, id2, id3, id4 = square_ids
+                if dead_edge_list[id1] or dead_edge_list[id2] or dead_edge_list[id3] or dead_edge_list[id4] :
+                    # 選ばれない枝を除いた残りが3つ以上ある時だけ制約を作る．
+                    var_list = [edge_var_list[i] for i in square_ids if not dead_edge_list[i]]
+                    if len(var_list) >= 3 :
+                        add_at_most_two(var_list)
+                else :
+                    add_at_most_two([edge_var_list[id1], edge_var_list[id2], edge_var_list[id3], edge_var_list[id4]])
 
     ## @brief 2x3マスのコの字経路を禁止する制約を作る．
     #
@@ -114,61 +150,48 @@ class CnfEncoder :
     # これをxy方向に対して行う．
     def make_wshape_constraint(self) :
         graph = self.__graph
-        for node in graph.node_list :
-            self.__wshape_sub(node, 1, 3)
-            self.__wshape_sub(node, 3, 1)
+        wshape_sub = self.__wshape_sub
+        # 長方形の表はグラフが持っているのでそれをたどる．
+        for rect_h, rect_v in zip(graph.rect_list(1, 3, 2), graph.rect_list(3, 1, 2)) :
+            if rect_h != None :
+                wshape_sub(rect_h)
+            if rect_v != None :
+                wshape_sub(rect_v)
 
     ## @brief make_wshape_constraint() の下請け関数
-    def __wshape_sub(self, node_00, dir1, dir2) :
-        edge_h1 = node_00.edge(dir1)
-        if edge_h1 == None :
-            return
-        node_10 = edge_h1.alt_node(node_00)
-        if node_10.is_terminal :
-            return
-
-        edge_h2 = node_10.edge(dir1)
-        if edge_h2 == None :
+    ## @param[in] rect Graph.rect_list() の要素
+    def __wshape_sub(self, rect) :
+        upper_nodes, lower_nodes, upper_ids, lower_ids, id_v1, id_v2 = rect
+        node_00, node_10, node_20 = upper_nodes
+        node_01, node_11, node_21 = lower_nodes
+        if node_10.is_terminal or node_11.is_terminal :
             return
-        node_20 = edge_h2.alt_node(node_10)
-
-        edge_v1 = node_00.edge(dir2)
-        if edge_v1 == None :
-            return
-        edge_v2 = node_20.edge(dir2)
-
-        node_01 = edge_v1.alt_node(node_00)
-        node_21 = edge_v2.alt_node(node_20)
-
-        edge_h3 = node_01.edge(dir1)
-        node_11 = edge_h3.alt_node(node_01)
-        if node_11.is_terminal :
-            return
-
-        edge_h4 = node_11.edge(dir1)
 
         solver = self.__solver
-        var1 = self.edge_var(edge_v1)
-        var4 = self.edge_var(edge_v2)
+        evar_list = self.__edge_var_list
+        var1 = evar_list[id_v1]
+        var4 = evar_list[id_v2]
         if not (node_00.is_terminal or node_20.is_terminal) :
-            var2 = self.edge_var(edge_h1)
-            var3 = self.edge_var(edge_h2)
+            id_h1, id_h2 = upper_ids
+            var2 = evar_list[id_h1]
+            var3 = evar_list[id_h2]
             z1_edge = node_11.z1_edge
             z2_edge = node_11.z2_edge
             if z1_edge == None or z2_edge == None :
                 solver.add_clause([~var1, ~var2, ~var3, ~var4])
             else :
-                cvar1 = self.edge_var(z1_edge)
+                cvar1 = evar_list[z1_edge.id]
                 solver.add_clause([ cvar1, ~var1, ~var2, ~var3, ~var4])
         if not (node_01.is_terminal or node_21.is_terminal) :
-            var2 = self.edge_var(edge_h3)
-            var3 = self.edge_var(edge_h4)
+            id_h3, id_h4 = lower_ids
+            var2 = evar_list[id_h3]
+            var3 = evar_list[id_h4]
             z1_edge = node_10.z1_edge
             z2_edge = node_10.z2_edge
             if z1_edge == None or z2_edge == None :
                 solver.add_clause([~var1, ~var2, ~var3, ~var4])
             else :
-                cvar1 = self.edge_var(z1_edge)
+                cvar1 = evar_list[z1_edge.id]
                 solver.add_clause([ cvar1, ~var1, ~var2, ~var3, ~var4])
 
     ## @brief L字型制約を作る．
@@ -187,73 +210,93 @@ class CnfEncoder :
         graph = self.__graph
         w1 = graph.width - 1
         h1 = graph.height - 1
+
+        # 各方向について最初に現れる終端の表を作っておく．
+        self.__ray_table_dict = dict()
+        for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)) :
+            self.__ray_table_dict[(dx, dy)] = self.__make_ray_table(dx, dy)
+
+        lshape_sub = self.__lshape_sub
         for node in graph.node_list :
             if node.is_terminal :
                 continue
             if node.x == 0 or node.x == w1 or node.y == 0 or node.y == h1 :
                 # 外周部には制約を設けない．
                 continue
-            self.__lshape_sub(node, -1, -1)
-            self.__lshape_sub(node, -1,  1)
-            self.__lshape_sub(node,  1, -1)
-            self.__lshape_sub(node,  1,  1)
+            lshape_sub(node, -1, -1)
+            lshape_sub(node, -1,  1)
+            lshape_sub(node,  1, -1)
+            lshape_sub(node,  1,  1)
 
     def __lshape_sub(self, node_00, dx, dy) :
+        graph = self.__graph
+        id0 = node_00.id
+        # 枝は Node.edge() ではなくグラフの方向ごとの表から ID 番号で引く．
         dir1 = (1 - dx) // 2
-        edge1 = node_00.edge(dir1)
-        if edge1 == None :
+        edge_id1 = graph.edge_id_list(dir1)[id0]
+        if edge_id1 == -1 :
             return
-        dir2 = (1 - dy) // 2
-        edge2 = node_00.edge(dir2)
-        if edge2 == None :
+        # 2本目は Y軸方向(2, 3)の枝を選ぶ．
+        # (1 - dy) // 2 だと dx == dy の時に X軸方向の同じ枝になり，
+        # [~e, ~e] という単位節で枝を禁止してしまう．
+        dir2 = (1 - dy) // 2 + 2
+        edge_id2 = graph.edge_id_list(dir2)[id0]
+        if edge_id2 == -1 :
             return
 
-        graph = self.__graph
-        w = graph.width
-        h = graph.height
-        x0 = node_00.x
-        y0 = node_00.y
-        z0 = node_00.z
-        rx = w - x0 if dx > 0 else x0 + 1
-        ry = h - y0 if dy > 0 else y0 + 1
-
-        # X軸方向に端子があるかを調べる．
-        def xcheck(graph, x0, y0, z0, dx, rx) :
-            for i in range(1, rx) :
-                x1 = x0 + i * dx
-                node = graph.node(x1, y0, z0)
-                if node.is_terminal :
-                    return True, node.terminal_id
-            return False, 0
-
-        # Y軸方向に端子があるかを調べる．
-        def ycheck(graph, x0, y0, z0, dy, ry) :
-            for i in range(1, ry) :
-                y1 = y0 + i * dy
-                node = graph.node(x0, y1, z0)
-                if node.is_terminal :
-                    return True, node.terminal_id
-            return False, 0
-
-        xcheck, xnet_id = xcheck(graph, x0, y0, z0, dx, rx)
-        ycheck, ynet_id = ycheck(graph, x0, y0, z0, dy, ry)
-        if xcheck and ycheck and (xnet_id == ynet_id) :
+        ray_table_dict = self.__ray_table_dict
+
+        # X軸方向，Y軸方向に端子があるかを調べる．
+        xnet_id = ray_table_dict[(dx, 0)][id0]
+        ynet_id = ray_table_dict[(0, dy)][id0]
+        if xnet_id != None and ynet_id != None and (xnet_id == ynet_id) :
             # X軸方向，Y軸方向ともに同じネット番号の端子がある場合は制約を付けない．
             return
 
-        r = rx if rx < ry else ry
-        for i in range(1, r) :
-            x1 = x0 + i * dx
-            y1 = y0 + i * dy
-            node = graph.node(x1, y1, z0)
-            if node.is_terminal :
-                # 45度方向に端子がある場合にも制約を付けない．
-                return
+        if ray_table_dict[(dx, dy)][id0] != None :
+            # 45度方向に端子がある場合にも制約を付けない．
+            return
 
         # 上記のスクリーニングで引っかからない場合にはL字制約をつける．
-        evar1 = self.edge_var(edge1)
-        evar2 = self.edge_var(edge2)
-        self.__solver.add_clause([~evar1, ~evar2])
+        evar_list = self.__edge_var_list
+        self.__solver.add_clause([~evar_list[edge_id1], ~evar_list[edge_id2]])
+
+    ## @brief 各節点から (dx, dy) 方向に進んだ時に最初に現れる終端の表を作る．
+    ## @param[in] dx, dy 進む方向(-1, 0, 1 のいずれか)
+    ## @return ray_table[node.id] に node から見た結果を入れたリストを返す．
+    ##
+    ## 終端の時はその線分番号を入れる．
+    ## 現れない時は None を入れる．
+    ##
+    ## 隣の節点の結果を使い回せるように，(dx, dy) 方向の端から順に求める．
+    def __make_ray_table(self, dx, dy) :
+        graph = self.__graph
+        w = graph.width
+        h = graph.height
+        x_list = range(w - 1, -1, -1) if dx > 0 else range(0, w)
+        y_list = range(h - 1, -1, -1) if dy > 0 else range(0, h)
+        node_list = graph.node_list
+        ray_table = [None for node in node_list]
+        # 節点の ID 番号は (x, y, z) のインデックス ((z * h) + y) * w + x に等しいので
+        # (dx, dy) 方向の隣の節点の ID 番号は dy * w + dx だけずれる．
+        offset = dy * w + dx
+        for z in range(0, graph.depth) :
+            for x in x_list :
+                x1 = x + dx
+                if x1 < 0 or x1 >= w :
+                    continue
+                for y in y_list :
+                    y1 = y + dy
+                    if y1 < 0 or y1 >= h :
+                        continue
+                    id0 = (z * h + y) * w + x
+                    node1 = node_list[id0 + offset]
+                    if node1.is_terminal :
+                        val = node1.terminal_id
+                    else :
+                        val = ray_table[node1.id]
+                    ray_table[id0] = val
+        return ray_table
 
 
     ## @brief Y字経路を禁止する制約を生成する．
@@ -279,17 +322,20 @@ class CnfEncoder :
     ## 1: node_10 が空きでなければ edge3 は選ばれる．
     ## 2: node_11 が空きでなければ edge4 は選ばれる．
     ##
-    ## edge3, edge4 がない場合は node_10, node_11 が空きでなければならない．
+    ## edge3, edge4 がない場合は node_10, node_11 が空きであることを表す
+    ## 変数がないので制約は作らない．
     def make_yshape_constraint(self) :
         graph = self.__graph
+        yshape_sub = self.__yshape_sub
         for node in graph.node_list :
             if node.is_terminal :
                 continue
-            self.__yshape_sub(node, 0, 2)
-            self.__yshape_sub(node, 2, 0)
+            yshape_sub(node, 0, 2)
+            yshape_sub(node, 2, 0)
 
     def __yshape_sub(self, node_10, dir1, dir3) :
         solver = self.__solver
+        evar_list = self.__edge_var_list
 
         node_11 = node_10.adj_node(dir3)
         if node_11 == None or node_11.is_terminal :
@@ -302,25 +348,27 @@ class CnfEncoder :
 
         edge1 = node_00.edge(dir3)
         edge2 = node_20.edge(dir3)
-        evar1 = self.edge_var(edge1)
-        evar2 = self.edge_var(edge2)
+        evar1 = evar_list[edge1.id]
+        evar2 = evar_list[edge2.id]
 
-        uvar0 = self.node_uvar(node_10)
         edge3 = node_10.edge(dir3 + 1)
-        if edge3 == None :
-            solver.add_clause([~evar1, ~evar2, ~uvar0])
-        else :
-            evar3 = self.edge_var(edge3)
+        if edge3 != None :
+            evar3 = evar_list[edge3.id]
             solver.add_clause([~evar1, ~evar2,  evar3])
 
-        uvar1 = self.node_uvar(node_11)
         edge4 = node_11.edge(dir3)
-        if edge4 == None :
-            solver.add_clause([~evar1, ~evar2, ~uvar1])
-        else :
-            evar4 = self.edge_var(edge4)
+        if edge4 != None :
+            evar4 = evar_list[edge4.id]
             solver.add_clause([~evar1, ~evar2,  evar4])
 
+    ## @brief 生成した CNF式を DIMACS 形式で出力する．
+    ## @param[in] fout 出力先のファイルオブジェクト
+    ##
+    ## solver_type に 'dimacs' を指定して作った時のみ使える．
+    def export_dimacs(self, fout) :
+        assert isinstance(self.__solver, DimacsWriter)
+        self.__solver.write(fout)
+
     ## @brief 問題を解く．
     ## @return result, solution を返す．
     ##
@@ -344,7 +392,17 @@ class CnfEncoder :
         if stat == Bool3.TRUE :
             verbose = False
             net_num = self.__graph.net_num
-            route_list = [self.__find_route(net_id, model) for net_id in range(0, net_num)]
+            # 各枝が選ばれているかどうかを先に求めておく．
+            # edge_sel_list[edge.id] が True なら edge が選ばれている．
+            # 枝の変数は make_base_constraint() の最初にまとめて作っているので
+            # 変数番号は edge.id の順に連続している．
+            # そこで先頭の変数番号からの差分で model を引く．
+            evar_list = self.__edge_var_list
+            ne = len(evar_list)
+            base = evar_list[0].varid().val()
+            assert evar_list[ne - 1].varid().val() == base + ne - 1
+            edge_sel_list = [model[base + i] == Bool3.TRUE for i in range(0, ne)]
+            route_list = [self.__find_route(net_id, edge_sel_list) for net_id in range(0, net_num)]
             router = Router(self.__graph.dimension, route_list, verbose)
             router.reroute()
             solution = router.to_solution()
@@ -355,10 +413,13 @@ class CnfEncoder :
             return 'Abort', None
 
     ## @brief SATモデルから経路を作る．
-    def __find_route(self, net_id, model) :
+    ## @param[in] net_id 線分番号
+    ## @param[in] edge_sel_list 枝が選ばれているかを表すフラグのリスト
+    def __find_route(self, net_id, edge_sel_list) :
         graph = self.__graph
         start, end = graph.terminal_node_pair(net_id)
-        prev = None
+        # prev_id は直前にたどった枝の ID 番号(最初は -1)
+        prev_id = -1
         node = start
         route = []
         while True :
@@ -367,18 +428,18 @@ class CnfEncoder :
                 break
 
             next = None
+            next_id = -1
             # 未処理かつ選ばれている枝を探す．
-            for edge in node.edge_list :
-                elit = self.edge_var(edge)
-                evar = elit.varid()
-                if model[evar.val()] != Bool3.TRUE :
+            # そのような枝はただ一つなので見つかった時点で打ち切る．
+            # 枝と反対側のノードは node.adj_list から直接得る．
+            for edge_id, alt_node in node.adj_list :
+                if edge_id == prev_id or not edge_sel_list[edge_id] :
                     continue
-                node1 = edge.alt_node(node)
-                if node1 == prev :
-                    continue
-                next = node1
+                next = alt_node
+                next_id = edge_id
+                break
             assert next != None
-            prev = node
+            prev_id = next_id
             node = next
 
         return route
@@ -388,19 +449,24 @@ class CnfEncoder :
         w = graph.width
         h = graph.height
         d = graph.depth
+        # ラベル変数は連続した番号で作られているので
+        # node の i 番目の変数番号は var_base + node.id * n + i となる．
+        n = self.__node_var_num
+        var_base = self.__node_var_array[0].varid().val() if n > 0 else 0
         for z in range(0, d) :
             print('LAYER#{}'.format(z + 1))
             for y in range(0, h) :
                 for x in range(0, w) :
                     node = graph.node(x, y, z)
-                    lvar_list = self.__node_vars_list[node.id]
+                    base = var_base + node.id * n
+                    label = 0
                     if self.__binary_encoding :
-                        label = 0
-                        for i, lvar in enumerate(lvar_list) :
-                            if model[lvar.varid().val()] == Bool3.TRUE :
-                                label += (1 << i)
-                        for i, lvar in enumerate(lvar_list) :
-                            if model[lvar.varid().val()] == Bool3.TRUE :
+                        for i in range(0, n) :
+                            if model[base + i] == Bool3.TRUE :
+                                label |= (1 << i)
+                    else :
+                        for i in range(0, n) :
+                            if model[base + i] == Bool3.TRUE :
                                 label = i
                     print(' {:2d}'.format(label), end='')
                     if x < w - 1 :
@@ -427,51 +493,37 @@ class CnfEncoder :
             print('')
 
 
-    ## @brief ノードに接続する枝に関する制約を作る．
+    ## @brief 通常のノードに接続する枝に関する制約を作る．
+    # @param[in] node 対象のノード
+    # @param[in] evar_list node に接続している枝の変数のリスト
     # @param[in] no_slack すべてのマス目を使う制約を入れるときに True にするフラグ
     #
-    # 具体的には
-    # - 終端の場合
-    #   ただ一つの枝のみが選ばれる．
-    # - ビアの場合
-    #   nv_map の変数によって終端になる場合と孤立する場合がある．
-    # - それ以外
-    #   全て選ばれないか2つの枝が選ばれる．
-    def __make_edge_constraint(self, node, no_slack) :
+    # 全て選ばれないか2つの枝が選ばれる．
+    #
+    # 終端の場合は __make_terminal_edge_constraint() で扱う．
+    # どちらを呼ぶかは make_base_constraint() で node.kind によって表引きで決める．
+    def __make_edge_constraint(self, node, evar_list, no_slack) :
         solver = self.__solver
-        graph = self.__graph
-
-        # node に接続している枝の変数のリスト
-        evar_list = [self.__edge_var_list[edge.id] for edge in node.edge_list]
+        if no_slack :
+            # 常に２個の枝が選ばれる．
+            solver.add_exact_two(evar_list)
+        else :
+            # ０個か２個の枝が選ばれる．
+            solver.add_at_most_two(evar_list)
+            solver.add_not_one(evar_list)
 
-        if node.is_terminal :
-            # node が終端の場合
+    ## @brief 終端のノードに接続する枝に関する制約を作る．
+    # @param[in] node 対象のノード
+    # @param[in] evar_list node に接続している枝の変数のリスト
+    # @param[in] no_slack すべてのマス目を使う制約を入れるときに True にするフラグ
+    #
+    # ただ一つの枝のみが選ばれる．
+    def __make_terminal_edge_constraint(self, node, evar_list, no_slack) :
+        # ただ一つの枝が選ばれる．
+        self.__solver.add_exact_one(evar_list)
 
-            # ただ一つの枝が選ばれる．
-            solver.add_exact_one(evar_list)
-
-            # 同時にラベルの変数を固定する．
-            self.__make_label_constraint(node, node.terminal_id)
-        else :
-            if no_slack :
-                # 常に２個の枝が選ばれる．
-                solver.add_exact_two(evar_list)
-            else :
-                # uvar が True の時は2つの枝が選ばれる．
-                # そうでなければ選ばれない．
-                """
-                uvar = self.node_uvar(node)
-                if self.__old_type and False :
-                    add_at_most_two(solver, evar_list)
-                    add_at_least_two(solver, evar_list, cvar_list = [uvar])
-                else :
-                    solver.add_at_most_two(evar_list)
-                    solver.add_at_least_two(evar_list, cvar_list = [uvar])
-                for evar in evar_list :
-                    solver.add_clause([ uvar, ~evar])
-                """
-                solver.add_at_most_two(evar_list)
-                solver.add_not_one(evar_list)
+        # 同時にラベルの変数を固定する．
+        self.__make_label_constraint(node, node.terminal_id)
 
     ## @brief 枝の両端のノードのラベルに関する制約を作る．
     # @param[in] edge 対象の枝
@@ -480,45 +532,73 @@ class CnfEncoder :
     def __make_adj_nodes_constraint(self, edge) :
         solver = self.__solver
         evar = self.__edge_var_list[edge.id]
-        var_list1 = self.__node_vars_list[edge.node1.id]
-        var_list2 = self.__node_vars_list[edge.node2.id]
-        n = len(var_list1)
-        for i in range(0, n) :
-            var1 = var_list1[i]
-            var2 = var_list2[i]
-            solver.add_eq_rel(var1, var2, cvar_list = [evar])
-        if self.__binary_encoding :
-            pass
-        else :
-            # cvar が False なら var_list1 と var_list2 は等しくない．
-            for i in range(0, n) :
-                var1 = var_list1[i]
-                var2 = var_list2[i]
-                solver.add_clause([ evar, ~var1, ~var2])
+        nvar_array = self.__node_var_array
+        n = self.__node_var_num
+        base1 = edge.node1.id * n
+        base2 = edge.node2.id * n
+        cvar_list = [evar]
+        add_eq_rel = solver.add_eq_rel
+        for var1, var2 in zip(nvar_array[base1:base1 + n], nvar_array[base2:base2 + n]) :
+            add_eq_rel(var1, var2, cvar_list = cvar_list)
+
+    ## @brief one-hot 符号化の時の枝の両端のノードのラベルに関する制約を作る．
+    # @param[in] edge 対象の枝
+    #
+    # __make_adj_nodes_constraint() の制約に加えて，
+    # その枝が選ばれていないとき両端のノードのラベルは等しくないという制約を作る．
+    #
+    # 両方の制約で枝の変数と変数の位置を共有するので
+    # __make_adj_nodes_constraint() は呼ばずにここでまとめて作る．
+    def __make_adj_nodes_constraint_onehot(self, edge) :
+        solver = self.__solver
+        evar = self.__edge_var_list[edge.id]
+        n = self.__node_var_num
+        base1 = edge.node1.id * n
+        base2 = edge.node2.id * n
+
+        # cvar が True なら var_list1 と var_list2 は等しい．
+        nvar_array = self.__node_var_array
+        cvar_list = [evar]
+        add_eq_rel = solver.add_eq_rel
+        for var1, var2 in zip(nvar_array[base1:base1 + n], nvar_array[base2:base2 + n]) :
+            add_eq_rel(var1, var2, cvar_list = cvar_list)
+
+        # cvar が False なら var_list1 と var_list2 は等しくない．
+        nnvar_array = self.__node_nvar_array
+        add_clause = solver.add_clause
+        for nnvar1, nnvar2 in zip(nnvar_array[base1:base1 + n], nnvar_array[base2:base2 + n]) :
+            add_clause([ evar, nnvar1, nnvar2])
 
     ## @brief ラベル値を固定する制約を作る．
     # @param[in] node 対象のノード
     # @param[in] net_id 固定する線分番号
     def __make_label_constraint(self, node, net_id) :
-        lvar_list = self.__node_vars_list[node.id]
-        if self.__binary_encoding :
-            for i, lvar in enumerate(lvar_list) :
-                if (1 << i) & (net_id + 1) :
-                    tmp_lit =  lvar
-                else :
-                    tmp_lit = ~lvar
-                self.__solver.add_clause([tmp_lit])
-        else :
-            for i, lvar in enumerate(lvar_list) :
-                if i == net_id :
-                    tmp_lit =  lvar
-                else :
-                    tmp_lit = ~lvar
-                self.__solver.add_clause([tmp_lit])
+        add_clause = self.__solver.add_clause
+        lvar_list = self.node_vars(node)
+        for lvar, pol in zip(lvar_list, self.__label_pattern_list[net_id]) :
+            if pol :
+                add_clause([lvar])
+            else :
+                add_clause([~lvar])
 
-    ## @brief ノードに対する uvar を返す．
-    def node_uvar(self, node) :
-        return self.__uvar_list[node.id]
+    ## @brief 変数をまとめて作る．
+    # @param[in] n 作る変数の数
+    # @return 変数(に対応するリテラル)のリストを返す．
+    #
+    # DimacsWriter の場合は変数番号の range が返る．
+    def __new_variables(self, n) :
+        solver = self.__solver
+        if isinstance(solver, DimacsWriter) :
+            return solver.new_variables(n)
+        new_variable = solver.new_variable
+        return [new_variable() for i in range(0, n)]
+
+    ## @brief ノードに対するラベル変数のリストを返す．
+    # @param[in] node 対象のノード
+    def node_vars(self, node) :
+        n = self.__node_var_num
+        base = node.id * n
+        return self.__node_var_array[base:base + n]
 
     ## @brief 枝に対する変数番号を返す．
     # @param[in] edge 対象の枝
@@ -27,6 +27,20 @@ def solve_nlink(graph, var_limit, binary_encoding) :
     return status, None
 
 
+## @brief 問題を表すCNF式を DIMACS 形式で出力する．
+# @param[in] graph 問題を表すグラフ(Graph)
+# @param[in] fout 出力先のファイルオブジェクト
+#
+# plan_C と同じ制約を SATソルバを使わずに直接書き出す．
+def write_dimacs(graph, fout, binary_encoding) :
+
+    enc = CnfEncoder(graph, 'dimacs', binary_encoding)
+
+    enc.make_base_constraint(False)
+
+    enc.export_dimacs(fout)
+
+
 ## @brief 最も簡単な戦略
 def plan_C(graph, var_limit, binary_encoding) :
 
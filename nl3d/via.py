@@ -23,8 +23,12 @@
 ### @endcode
 ###
 ### という風に使う．
+###
+### __slots__ でメンバを固定してインスタンスごとの辞書を持たないようにしている．
 class Via :
 
+    __slots__ = ('__label', '__x', '__y', '__z1', '__z2')
+
     ### @brief 初期化
     ### @param[in] label ラベル
     ### @param[in] x X座標
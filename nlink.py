@@ -26,6 +26,8 @@ parser.add_argument('-l', '--var_limit', type = int,
                     help = 'specify the variable number limit')
 parser.add_argument('-b', '--binary_encoding', action = 'store_true',
                     help = 'use binary_encoding')
+parser.add_argument('-d', '--dimacs', type = str,
+                    help = 'write the CNF in DIMACS format to the file (adc2017 only)')
 parser.add_argument('-v', '--verbose', action = 'store_true',
                     help = 'set verbose mode')
 parser.add_argument('input', type = str,
@@ -56,6 +58,9 @@ format = args.format
 # verbose フラグ
 verbose = args.verbose
 
+# DIMACS 形式の出力ファイル名 or None
+dimacs_file = args.dimacs
+
 with open(ifile, 'r') as fin :
     problem = nl3d.read_problem(fin)
 
@@ -68,6 +73,14 @@ with open(ifile, 'r') as fin :
 
     graph = nl3d.Graph(problem, format)
 
+    if dimacs_file :
+        if graph.rule != 'adc2017' :
+            print('DIMACS output is supported only for adc2017.')
+            exit(-1)
+        with open(dimacs_file, 'wt') as fout :
+            nl3d.v2017.write_dimacs(graph, fout, binary_encoding)
+        exit(0)
+
     if graph.rule == 'adc2015' :
         # ADC2015 フォーマット
         status, solution = nl3d.v2015.solve_nlink(graph, var_limit, binary_encoding)